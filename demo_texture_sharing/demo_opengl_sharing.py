@@ -207,20 +207,42 @@ def demo_opengl_sharing(use_dcg_context=True):
             raise RuntimeError("Failed to make GLX context current")
 
     if backend == "WGL":
+        import ctypes.wintypes
         # Create dummy window for context creation
-        WNDCLASS = ctypes.wintypes.WNDCLASS()
-        WNDCLASS.lpfnWndProc = ctypes.WINFUNCTYPE(ctypes.c_long, ctypes.c_void_p, ctypes.c_uint, ctypes.c_uint, ctypes.c_void_p)(lambda h, m, w, l: 0)
+        user32 = ctypes.windll.user32
+        user32.CreateWindowExA.restype = ctypes.wintypes.HWND
+        user32.GetDC.argtypes = [ctypes.wintypes.HWND]
+        user32.GetDC.restype = ctypes.wintypes.HDC
+
+        # ctypes.wintypes has no WNDCLASS. The window procedure
+        # is typed as a plain pointer as we pass an address.
+        class WNDCLASSA(ctypes.Structure):
+            _fields_ = [("style", ctypes.wintypes.UINT),
+                        ("lpfnWndProc", ctypes.c_void_p),
+                        ("cbClsExtra", ctypes.c_int),
+                        ("cbWndExtra", ctypes.c_int),
+                        ("hInstance", ctypes.wintypes.HINSTANCE),
+                        ("hIcon", ctypes.wintypes.HICON),
+                        ("hCursor", ctypes.wintypes.HANDLE),
+                        ("hbrBackground", ctypes.wintypes.HBRUSH),
+                        ("lpszMenuName", ctypes.wintypes.LPCSTR),
+                        ("lpszClassName", ctypes.wintypes.LPCSTR)]
+
+        WNDCLASS = WNDCLASSA()
+        # Use the default window procedure directly: a Python callback
+        # would make every message to the dummy window take the GIL
+        WNDCLASS.lpfnWndProc = ctypes.cast(user32.DefWindowProcA, ctypes.c_void_p).value
         WNDCLASS.style = 0
         WNDCLASS.hInstance = 0
-        WNDCLASS.lpszClassName = "DummyClass"
-        ctypes.windll.user32.RegisterClassA(ctypes.byref(WNDCLASS))
+        WNDCLASS.lpszClassName = b"DummyClass"
+        user32.RegisterClassA(ctypes.byref(WNDCLASS))
         
-        dummy_window = ctypes.windll.user32.CreateWindowExA(
-            0, WNDCLASS.lpszClassName, "", 0,
+        dummy_window = user32.CreateWindowExA(
+            0, WNDCLASS.lpszClassName, b"", 0,
             0, 0, 1, 1, 0, 0, WNDCLASS.hInstance, 0
         )
         
-        dummy_dc = ctypes.windll.user32.GetDC(dummy_window)
+        dummy_dc = user32.GetDC(dummy_window)
         
         # Create shared context using wglCreateContextAttribsARB
         attribs = [
@@ -6,28 +6,247 @@ from pygments import highlight
 from pygments.formatters import Terminal256Formatter
 from pygments.lexers import get_lexer_by_name, guess_lexer
 from pygments.util import ClassNotFound
-from stransi import Ansi, SetAttribute, SetColor
-from stransi.attribute import Attribute as AnsiAttribute
-from stransi.color import ColorRole as AnsiColorRole
 
+import collections
+import concurrent.futures
+import functools
 import marko
 import os
 import inspect
+import re
+import threading
 import time
+import traceback
 import imageio
+import weakref
 
+# The font markup functions are pure and called again and
+# again on the same words: cache their output.
+make_bold = functools.lru_cache(maxsize=4096)(make_bold)
+make_italic = functools.lru_cache(maxsize=4096)(make_italic)
+make_bold_italic = functools.lru_cache(maxsize=4096)(make_bold_italic)
 
-def blinking_callback(sender, item):
-    t = int(time.time())
-    text_color = item.theme.children[0].Text
-    c = dcg.color_as_floats(text_color)
-    # Alternate between transparent and full
-    if t % 2 == 0:
-        c = (c[0], c[1], c[2], 0)
-    else:
-        c = (c[0], c[1], c[2], 1.)
-    item.theme.children[0].Text = c
-    item.context.viewport.wake()
+
+# Themes, fonts, etc are shared by reference, thus there is
+# no need to build new ones each time. Only weak references
+# are kept: the items using a shared object keep it alive,
+# and a closed context can be collected with its items.
+_SHARED_OBJECTS = weakref.WeakKeyDictionary()
+
+def get_shared(C, key, build):
+    """
+    Object of the context C identified by key.
+    build() is called to create it if it doesn't
+    exist, or is no longer used.
+    """
+    shared = _SHARED_OBJECTS.get(C, None)
+    if shared is None:
+        shared = weakref.WeakValueDictionary()
+        _SHARED_OBJECTS[C] = shared
+    obj = shared.get(key, None)
+    if obj is None:
+        obj = build()
+        shared[key] = obj
+    return obj
+
+def get_no_spacing_theme(C):
+    return get_shared(C, "no_spacing_theme",
+                      lambda: dcg.ThemeStyleImGui(C, FramePadding=(0,0), FrameBorderSize=0, ItemSpacing=(0, 0)))
+
+def get_no_item_spacing_theme(C):
+    return get_shared(C, "no_item_spacing_theme",
+                      lambda: dcg.ThemeStyleImGui(C, ItemSpacing=(0, 0)))
+
+def make_text_theme(context, color, background_color):
+    """
+    Theme to render text of the target color and
+    background color inside small buttons.
+    """
+    theme = dcg.ThemeList(context)
+    theme_style = dcg.ThemeStyleImGui(context,
+                                      ItemSpacing=(0, 0),
+                                      FrameBorderSize=0,
+                                      FramePadding=(0, 0),
+                                      FrameRounding=0,
+                                      ItemInnerSpacing=(0, 0))
+    theme_color = dcg.ThemeColorImGui(context)
+    theme.children = [theme_color, theme_style]
+    bg_color = background_color if background_color is not None else (0, 0, 0, 0)
+    theme_color.Button = bg_color
+    theme_color.ButtonHovered = bg_color
+    theme_color.ButtonActive = bg_color
+    theme_color.Text = color
+    return theme
+
+class BlinkingThemes:
+    """
+    Themes shared by all the blinking text of a context.
+    Toggling the text alpha of these few themes makes
+    all the blinking text blink at once.
+    The render handlers of the blinking text call
+    render_callback, which keeps this object alive.
+    """
+    def __init__(self):
+        self.themes = {}
+        self.visible = True
+        self.wake_timer = None
+
+    def get(self, context, color, background_color):
+        key = (color, background_color)
+        entry = self.themes.get(key, None)
+        if entry is None:
+            theme = make_text_theme(context, color, background_color)
+            # Precompute the visible and hidden text colors
+            c = dcg.color_as_floats(color)
+            entry = (theme, (c[0], c[1], c[2], 1.), (c[0], c[1], c[2], 0))
+            self.themes[key] = entry
+            self.apply(entry)
+        return entry[0]
+
+    def apply(self, entry):
+        (theme, visible_color, hidden_color) = entry
+        theme.children[0].Text = visible_color if self.visible else hidden_color
+
+    def update(self, context):
+        # Alternate between transparent and full every second
+        now = time.monotonic()
+        visible = (int(now) & 1) == 1
+        if visible != self.visible:
+            self.visible = visible
+            for entry in self.themes.values():
+                self.apply(entry)
+            # Render the change
+            context.viewport.wake()
+        # wait_for_input: rather than rendering continuously,
+        # request a single frame for the next toggle.
+        if self.wake_timer is None or not(self.wake_timer.is_alive()):
+            self.wake_timer = threading.Timer(1. - now % 1. + 0.01, context.viewport.wake)
+            self.wake_timer.daemon = True
+            self.wake_timer.start()
+
+    def render_callback(self, sender, item):
+        self.update(item.context)
+
+def get_blinking_themes(context):
+    return get_shared(context, "blinking_themes", BlinkingThemes)
+
+# SGR ANSI escape sequence: ESC[<codes separated by ;>m
+_SGR_RE = re.compile(r"\u001b\[([\d;]*)m")
+
+# SGR codes changing a text attribute
+_SGR_ATTRIBUTES = {
+    1: ("bold", True),
+    3: ("italic", True),
+    4: ("underline", True),
+    5: ("blinking", True),
+    6: ("blinking", True),
+    22: ("bold", False),
+    23: ("italic", False),
+    24: ("underline", False),
+    25: ("blinking", False)
+}
+
+def _make_ansi_palette():
+    """The xterm 256 colors palette, as (r, g, b, 255)"""
+    palette = [(0, 0, 0), (128, 0, 0), (0, 128, 0), (128, 128, 0),
+               (0, 0, 128), (128, 0, 128), (0, 128, 128), (192, 192, 192),
+               (128, 128, 128), (255, 0, 0), (0, 255, 0), (255, 255, 0),
+               (0, 0, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255)]
+    levels = (0, 95, 135, 175, 215, 255)
+    palette += [(r, g, b) for r in levels for g in levels for b in levels]
+    palette += [(v, v, v) for v in range(8, 248, 10)]
+    return tuple(color + (255,) for color in palette)
+
+_ANSI_PALETTE = _make_ansi_palette()
+_WHITE = (255, 255, 255, 255)
+
+@functools.lru_cache(maxsize=4096)
+def parse_ansi(textline):
+    """
+    Split a line of text with SGR ANSI escape sequences
+    into runs of identical style.
+    Returns a tuple of ((color, background_color, blinking), text)
+    where the bold and italic attributes are already
+    applied to the text, and the colors are (r, g, b, a)
+    integer tuples (background_color may be None).
+    The result is cached, as the same lines are
+    displayed again and again.
+    """
+    color = _WHITE # Start with white
+    background_color = None
+    attributes = {
+        "bold": False,
+        "italic": False,
+        "underline": False, # TODO
+        "blinking": False
+    }
+    segments = []
+
+    def add_text(text):
+        if attributes["bold"] and attributes["italic"]:
+            text = make_bold_italic(text)
+        elif attributes["italic"]:
+            text = make_italic(text)
+        elif attributes["bold"]:
+            text = make_bold(text)
+        style_key = (color, background_color, attributes["blinking"])
+        if len(segments) > 0 and segments[-1][0] == style_key:
+            segments[-1][1] += text
+        else:
+            segments.append([style_key, text])
+
+    position = 0
+    for match in _SGR_RE.finditer(textline):
+        if match.start() > position:
+            add_text(textline[position:match.start()])
+        position = match.end()
+        codes = [int(code) if code else 0 for code in match.group(1).split(";")]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            i += 1
+            if code in _SGR_ATTRIBUTES:
+                (name, value) = _SGR_ATTRIBUTES[code]
+                attributes[name] = value
+            elif code == 0:
+                color = _WHITE
+                background_color = None
+                for name in attributes:
+                    attributes[name] = False
+            elif 30 <= code <= 37:
+                color = _ANSI_PALETTE[code - 30]
+            elif 90 <= code <= 97:
+                color = _ANSI_PALETTE[code - 90 + 8]
+            elif code == 39:
+                color = _WHITE
+            elif 40 <= code <= 47:
+                background_color = _ANSI_PALETTE[code - 40]
+            elif 100 <= code <= 107:
+                background_color = _ANSI_PALETTE[code - 100 + 8]
+            elif code == 49:
+                background_color = None
+            elif code == 38 or code == 48:
+                # 38;5;n / 48;5;n: 256 colors palette
+                # 38;2;r;g;b / 48;2;r;g;b: rgb
+                if i + 1 < len(codes) and codes[i] == 5:
+                    new_color = _ANSI_PALETTE[codes[i + 1] & 255]
+                    i += 2
+                elif i + 3 < len(codes) and codes[i] == 2:
+                    new_color = tuple(codes[i + 1:i + 4]) + (255,)
+                    i += 4
+                else:
+                    break
+                if code == 38:
+                    color = new_color
+                else:
+                    background_color = new_color
+            # Other codes are not supported and ignored
+    if position < len(textline):
+        add_text(textline[position:])
+    return tuple((style_key, text) for (style_key, text) in segments)
+
+# A word followed by its space, or the last word
+_WORD_RE = re.compile(r"[^ ]* |[^ ]+")
 
 class TextAnsi(dcg.HorizontalLayout):
     """
@@ -38,103 +257,83 @@ class TextAnsi(dcg.HorizontalLayout):
     def __init__(self, context, wrap=0, **kwargs):
         self.textline = ""
         self._bullet = False
-        self.theme = dcg.ThemeStyleImGui(self.context, ItemSpacing=(0, 0))
+        self._wrap = wrap
+        self._blinking_handler = None
+        self.theme = get_no_item_spacing_theme(context)
+        # Render only once all the attributes are set
+        value = kwargs.pop("value", "")
+        bullet = kwargs.pop("bullet", False)
         super().__init__(context, width=wrap, **kwargs)
+        self._bullet = bullet
+        self.value = value
 
     def render_text(self):
-        self.children = [] # detach any previous text
-        color = (255, 255, 255, 255) # Start with white
-        bold = False
-        italic = False
-        background_color = None
-        blinking = False
-        underline = False # TODO
-        strikethrough = False # TODO
-        with self:
-            if self._bullet:
-                dcg.Text(self.context, bullet=True, value="")
-            for instr in Ansi(self.textline).instructions():
-                if isinstance(instr, SetAttribute):
-                    if instr.attribute == AnsiAttribute.NORMAL:
-                        bold = False
-                        italic = False
-                        background_color = None
-                        blinking = False
-                        underline = False
-                        strikethrough = False
-                    elif instr.attribute == AnsiAttribute.BOLD:
-                        bold = True
-                    elif instr.attribute == AnsiAttribute.ITALIC:
-                        italic = True
-                    elif instr.attribute == AnsiAttribute.UNDERLINE:
-                        underline = True
-                    elif instr.attribute == AnsiAttribute.BLINK:
-                        blinking = True
-                    elif instr.attribute == AnsiAttribute.NEITHER_BOLD_NOR_DIM:
-                        bold = False
-                    elif instr.attribute == AnsiAttribute.NOT_ITALIC:
-                        italic = False
-                    elif instr.attribute == AnsiAttribute.NOT_UNDERLINE:
-                        underline = False
-                    elif instr.attribute == AnsiAttribute.NOT_BLINK:
-                        blinking = False
-                    else:
-                        raise RuntimeWarning("Unparsed Ansi: ", instr)
-                elif isinstance(instr, SetColor):
-                    if instr.role == AnsiColorRole.BACKGROUND:
-                        if instr.color is None:
-                            background_color = None
-                        else:
-                            background_color = instr.color.rgb
-                            background_color = (background_color.red, background_color.green, background_color.blue)
-                        continue
-                    if instr.color is None:
-                        # reset color
-                        color = (255, 255, 255, 255)
-                        continue
-                    color = instr.color.rgb
-                    color = (color.red, color.green, color.blue)
-                elif isinstance(instr, str):
-                    text = instr
-                    if bold and italic:
-                        text = make_bold_italic(text)
-                    elif italic:
-                        text = make_italic(text)
-                    elif bold:
-                        text = make_bold(text)
-                    words = text.split(" ")
-                    if background_color is None and not(blinking):
-                        # add a space at the end of each words,
-                        # except the last one.
-                        words = [w + " " for w in words[:-1]] + words[-1:]
-                        for word in words:
-                            dcg.Text(self.context, value=word, color=color)
-                    else:
-                        current_theme = dcg.ThemeList(self.context)
-                        current_theme_style = dcg.ThemeStyleImGui(self.context,
-                                                  ItemSpacing=(0, 0),
-                                                  FrameBorderSize=0,
-                                                  FramePadding=(0, 0),
-                                                  FrameRounding=0,
-                                                  ItemInnerSpacing=(0, 0))
-                        current_theme_color = dcg.ThemeColorImGui(self.context)
-                        current_theme.children = [current_theme_color, current_theme_style]
-                        bg_color = background_color if background_color is not None else (0, 0, 0, 0)
-                        current_theme_color.Button = bg_color
-                        current_theme_color.ButtonHovered = bg_color
-                        current_theme_color.ButtonActive = bg_color
-                        current_theme_color.Text = color
-                        words = [w + " " for w in words[:-1]] + words[-1:]
-                        # Wrapping the text within a button window.
-                        for word in words:
-                            dcg.Button(self.context,
+        # The children are built detached, and replace
+        # the previous ones in a single assignment.
+        C = self.context
+        children = []
+        if self._bullet:
+            children.append(dcg.Text(C, bullet=True, value="", attach=False))
+        if "\u001b" not in self.textline:
+            # Most text has no escape sequence
+            self.render_plain_text(children)
+            return
+        segments = parse_ansi(self.textline)
+
+        # A single handler for the whole line triggers the blinking
+        if any(blinking for ((_, _, blinking), _) in segments):
+            if self._blinking_handler is None:
+                self._blinking_handler = dcg.RenderHandler(C, callback=get_blinking_themes(C).render_callback)
+            self.handlers = [self._blinking_handler]
+        elif self._blinking_handler is not None:
+            self.handlers = []
+
+        if len(segments) == 1 and segments[0][0][1] is None and not(segments[0][0][2]):
+            # A single plain run: let dcg.Text do the wrapping
+            # rather than creating one item per word.
+            ((color, _, _), text) = segments[0]
+            children.append(dcg.Text(C, value=text, color=color,
+                                     wrap=-1 if self.no_wrap else self._wrap,
+                                     attach=False))
+            self.children = children
+            return
+        # The themes are shared by all the words with the same style.
+        style_themes = {}
+        for (style_key, text) in segments:
+            (color, background_color, blinking) = style_key
+            # One item per word (with its trailing space)
+            # for the words of the different runs to
+            # wrap together. Without wrapping, one item
+            # per run is enough.
+            words = [text] if self.no_wrap else _WORD_RE.findall(text)
+            if background_color is None and not(blinking):
+                children.extend(dcg.Text(C, value=word, color=color, attach=False)
+                                for word in words)
+                continue
+            if blinking:
+                current_theme = get_blinking_themes(C).get(C, color, background_color)
+            else:
+                current_theme = style_themes.get(style_key, None)
+                if current_theme is None:
+                    current_theme = make_text_theme(C, color, background_color)
+                    style_themes[style_key] = current_theme
+            # Wrapping the text within a button window.
+            children.extend(dcg.Button(C,
                                        label=word,
                                        small=True,
                                        theme=current_theme,
-                                       handlers=dcg.RenderHandler(self.context, callback=blinking_callback) if blinking else [])
-
-                else:
-                    raise RuntimeWarning("Unparsed Ansi: ", instr)
+                                       attach=False)
+                            for word in words)
+        self.children = children
+
+    def render_plain_text(self, children):
+        if self._blinking_handler is not None:
+            self.handlers = []
+        if self.textline != "":
+            children.append(dcg.Text(self.context, value=self.textline, color=_WHITE,
+                                     wrap=-1 if self.no_wrap else self._wrap,
+                                     attach=False))
+        self.children = children
 
     @property
     def bullet(self):
@@ -166,6 +365,23 @@ color_to_ansi = {
     "white": "97"
 }
 
+# Precomputed escape sequences for the named colors
+_FG_NAMED = {name: f"\u001b[{code}m" for (name, code) in color_to_ansi.items()}
+_BG_NAMED = {name: f"\u001b[{int(code)+10}m" for (name, code) in color_to_ansi.items()}
+
+def _fg_prefix(color):
+    (r, g, b, _) = dcg.color_as_ints(color)
+    return f"\u001b[38;2;{r};{g};{b}m"
+
+def _bg_prefix(color):
+    (r, g, b, _) = dcg.color_as_ints(color)
+    return f"\u001b[48;2;{r};{g};{b}m"
+
+# Only hashable colors can use the cached versions
+_cached_fg_prefix = functools.lru_cache(maxsize=256)(_fg_prefix)
+_cached_bg_prefix = functools.lru_cache(maxsize=256)(_bg_prefix)
+_HASHABLE_COLOR_TYPES = (int, tuple)
+
 def make_color(text : str, color : str | list = "white"):
     """
     Add ANSI escape codes to a text to render in color
@@ -176,14 +392,13 @@ def make_color(text : str, color : str | list = "white"):
         magenta, cyan and white
         Else a color in any dcg color format is supported.
     """
-    escape = "\u001b"
     if isinstance(color, str):
-        transformed = f"{escape}[{color_to_ansi[color]}m{text}{escape}[39m"
+        prefix = _FG_NAMED[color]
+    elif isinstance(color, _HASHABLE_COLOR_TYPES):
+        prefix = _cached_fg_prefix(color)
     else:
-        color = dcg.color_as_ints(color)
-        (r, g, b, _) = color
-        transformed = f"{escape}[38;2;{r};{g};{b}m{text}{escape}[39m"
-    return transformed
+        prefix = _fg_prefix(color)
+    return prefix + text + "\u001b[39m"
 
 def make_bg_color(text : str, color : str | list = "white"):
     """
@@ -195,14 +410,13 @@ def make_bg_color(text : str, color : str | list = "white"):
         magenta, cyan and white
         Else a color in any dcg color format is supported.
     """
-    escape = "\u001b"
     if isinstance(color, str):
-        transformed = f"{escape}[{str(int(color_to_ansi[color])+10)}m{text}{escape}[49m"
+        prefix = _BG_NAMED[color]
+    elif isinstance(color, _HASHABLE_COLOR_TYPES):
+        prefix = _cached_bg_prefix(color)
     else:
-        color = dcg.color_as_ints(color)
-        (r, g, b, _) = color
-        transformed = f"{escape}[48;2;{r};{g};{b}m{text}{escape}[49m"
-    return transformed
+        prefix = _bg_prefix(color)
+    return prefix + text + "\u001b[49m"
 
 def make_blinking(text : str):
     """
@@ -210,9 +424,104 @@ def make_blinking(text : str):
     using TextAnsi.
     text: the text string to blink
     """
-    escape = "\u001b"
-    transformed = f"{escape}[5m{text}{escape}[25m"
-    return transformed
+    return "\u001b[5m" + text + "\u001b[25m"
+
+# Looking up a Pygments lexer scans the installed plugins,
+# thus we keep the lexers around once found.
+_LEXER_CACHE = {}
+_FORMATTER = Terminal256Formatter(bg='dark', style='monokai')
+
+def clear_highlight_cache():
+    """
+    Forget the Pygments lexers found so far and the
+    highlighted code. Only useful if the Pygments
+    plugins change.
+    """
+    _LEXER_CACHE.clear()
+    with _HIGHLIGHT_LOCK:
+        _HIGHLIGHT_CACHE.clear()
+
+clear_lexer_cache = clear_highlight_cache
+
+def _get_lexer(lang, code):
+    """
+    Pygments lexer for lang. If lang is unknown,
+    the lexer is guessed from the code, and is
+    then used for all code of the same lang.
+    """
+    lexer = _LEXER_CACHE.get(lang)
+    if lexer is None and lang:
+        try:
+            lexer = get_lexer_by_name(lang, stripall=True, encoding='utf-8')
+        except ClassNotFound:
+            lexer = guess_lexer(code, encoding='utf-8')
+        _LEXER_CACHE[lang] = lexer
+    return lexer
+
+# The same docstrings are often shown several times,
+# thus we avoid running the lexer again on them.
+# The cache keeps the last _HIGHLIGHT_CACHE_SIZE used
+# code blocks (LRU).
+# The highlighting is run in a worker thread, a single
+# one such that the shared lexers and formatter are
+# never used concurrently.
+_HIGHLIGHT_CACHE = collections.OrderedDict()
+_HIGHLIGHT_CACHE_SIZE = 512
+_HIGHLIGHT_LOCK = threading.Lock()
+_HIGHLIGHT_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+def _get_highlighted(lang, code):
+    """
+    Highlighted version of code if cached, else None.
+    """
+    key = (lang, code)
+    with _HIGHLIGHT_LOCK:
+        text = _HIGHLIGHT_CACHE.get(key, None)
+        if text is not None:
+            _HIGHLIGHT_CACHE.move_to_end(key)
+    return text
+
+def _highlight_cached(lang, code):
+    """
+    Highlighted version of code.
+    """
+    text = _get_highlighted(lang, code)
+    if text is None:
+        lexer = _get_lexer(lang, code)
+        text = code if lexer is None else highlight(code, lexer, _FORMATTER)
+        with _HIGHLIGHT_LOCK:
+            _HIGHLIGHT_CACHE[(lang, code)] = text
+            if len(_HIGHLIGHT_CACHE) > _HIGHLIGHT_CACHE_SIZE:
+                _HIGHLIGHT_CACHE.popitem(last=False)
+    return text
+
+# Building the parser tables is not free,
+# thus all MarkDownText share the same parser.
+# The docstrings of the tooltips are parsed in advance
+# in a worker thread, thus the parser is locked.
+_MARKO = marko.Markdown()
+_MARKO_LOCK = threading.Lock()
+_PARSE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+@functools.lru_cache(maxsize=256)
+def parse_markdown(text):
+    """
+    Markdown document of the text. The same docstrings
+    are displayed again at each tooltip, thus the
+    documents are kept around. They must not be modified.
+    """
+    with _MARKO_LOCK:
+        return _MARKO.parse(text)
+
+# Building a font rasterizes its glyphs, thus
+# all the MarkDownText of a context share them.
+def get_heading_fonts(C):
+    """(huge, big) fonts for the headings"""
+    return (get_shared(C, "huge_font", lambda: dcg.AutoFont(C, 34)),
+            get_shared(C, "big_font", lambda: dcg.AutoFont(C, 25)))
+
+# A newline and the spaces that follow it
+_RAW_NEWLINE_RE = re.compile(r"\n *")
 
 class MarkDownText(dcg.Layout, marko.Renderer):
     """
@@ -240,12 +549,12 @@ class MarkDownText(dcg.Layout, marko.Renderer):
             self.big_font_scale = 1.5
             self.use_auto_scale = True
         else:
-            self.huge_font = dcg.AutoFont(C, 34)
-            self.big_font = dcg.AutoFont(C, 25)
+            # The heading fonts are only built
+            # once a heading is rendered
             self.use_auto_scale = False
         self.default_font = C.viewport.font
         self.wrap = wrap
-        self.no_spacing = dcg.ThemeStyleImGui(C, FramePadding=(0,0), FrameBorderSize=0, ItemSpacing=(0, 0))
+        self.no_spacing = get_no_spacing_theme(C)
         self._text = None
         marko.Renderer.__init__(self)
         dcg.Layout.__init__(self, C, **kwargs)
@@ -260,7 +569,7 @@ class MarkDownText(dcg.Layout, marko.Renderer):
         if not(isinstance(text, str)):
             raise ValueError("Expected a string as text")
         self._text = text
-        parsed_text = marko.Markdown().parse(text)
+        parsed_text = parse_markdown(text)
         with self:
             self.render(parsed_text)
 
@@ -313,25 +622,56 @@ class MarkDownText(dcg.Layout, marko.Renderer):
                 TextAnsi(self.C, bullet=True, value=make_italic(text))
         return ""
 
+    def render_code_lines(self, text):
+        """
+        Detached items displaying each line of text.
+        Consecutive lines without escape sequences,
+        as the code before highlighting, share a
+        single dcg.Text.
+        """
+        items = []
+        plain_lines = []
+        for line in text.split("\n"):
+            if "\u001b" not in line and line != "":
+                plain_lines.append(line)
+                continue
+            if len(plain_lines) > 0:
+                items.append(dcg.Text(self.C, value="\n".join(plain_lines), color=_WHITE, attach=False))
+                plain_lines = []
+            if line == "":
+                items.append(dcg.Spacer(self.C, attach=False))
+                continue
+            items.append(TextAnsi(self.C, value=line, no_wrap=True, attach=False))
+        if len(plain_lines) > 0:
+            items.append(dcg.Text(self.C, value="\n".join(plain_lines), color=_WHITE, attach=False))
+        return items
+
     def render_fenced_code(self, element):
         code = element.children[0].children
-        if element.lang:
-            try:
-                lexer = get_lexer_by_name(element.lang, stripall=True, encoding='utf-8')
-            except ClassNotFound:
-                lexer = guess_lexer(code, encoding='utf-8')
-        else:
-            lexer = None
-
-        formatter = Terminal256Formatter(bg='dark', style='monokai')
-        text = text if lexer is None else highlight(code, lexer, formatter)
-        with dcg.ChildWindow(self.C, indent=-1, auto_resize_y=True, theme=self.no_spacing):
-            lines = text.split("\n")
-            for line in lines:
-                if line == "":
-                    dcg.Spacer(self.C)
-                    continue
-                TextAnsi(self.C, value=line, no_wrap=True)
+        code_window = dcg.ChildWindow(self.C, indent=-1, auto_resize_y=True, theme=self.no_spacing)
+        if not element.lang:
+            # Nothing to highlight
+            code_window.children = self.render_code_lines(code)
+            return ""
+        text = _get_highlighted(element.lang, code)
+        if text is not None:
+            code_window.children = self.render_code_lines(text)
+            return ""
+        # Display the code without colors until
+        # the highlighting is ready
+        code_window.children = self.render_code_lines(code)
+        def show_highlighted(future):
+            if future.exception() is not None:
+                # Keep the code without colors
+                traceback.print_exception(future.exception())
+                return
+            if code_window.parent is None:
+                # The code block was deleted meanwhile
+                return
+            code_window.children = self.render_code_lines(future.result())
+            self.C.viewport.wake()
+        _HIGHLIGHT_POOL.submit(_highlight_cached, element.lang, code)\
+            .add_done_callback(show_highlighted)
         return ""
 
     def render_thematic_break(self, element):
@@ -352,7 +692,8 @@ class MarkDownText(dcg.Layout, marko.Renderer):
                     if text != "":
                         TextAnsi(self.C, wrap=self.wrap, value=text)
         else:
-            font = self.huge_font if level <= 1 else self.big_font
+            (huge_font, big_font) = get_heading_fonts(self.C)
+            font = huge_font if level <= 1 else big_font
             with dcg.Layout(self.C, font=font):
                 text = self.render_children_if_not_str(element)
                 if text != "":
@@ -373,17 +714,11 @@ class MarkDownText(dcg.Layout, marko.Renderer):
         return self.render_children_if_not_str(element)
 
     def render_raw_text(self, element):
-        # Trim spaces after a "\n"
-        text = self.render_children_if_not_str(element)
-        subtexts = text.split('\n')
-        new_subtexts = subtexts[0:1]
-        for subtext in subtexts[1:]:
-            i = 0
-            while i < len(subtext) and text[i] == ' ':
-                i = i + 1
-            new_subtexts.append(subtext[i:]) 
-        # convert newline into spaces
-        return " ".join(new_subtexts)
+        # Soft line breaks inside a paragraph are
+        # displayed as a single space (CommonMark):
+        # trim spaces after a "\n" and
+        # convert the newline into a space
+        return _RAW_NEWLINE_RE.sub(" ", self.render_children_if_not_str(element))
 
     def render_image(self, element) -> str:
         with dcg.ChildWindow(self.context, auto_resize_x=True, auto_resize_y=True):
@@ -413,71 +748,73 @@ class MarkDownText(dcg.Layout, marko.Renderer):
         return text
 
 class DocStringRenderer(pydoc.TextDoc):
-    def __init__(self, context):
+    def __init__(self, context=None):
         self.context = context
         super().__init__()
 
     def bold(self, text):
-        print(text)
         return make_color(make_bold(text), color="cyan")
     def indent(self, text, prefix='    '):
         if '|' in prefix and text[0] == ' ':
             return text
         return super().indent(text, prefix=prefix)
 
-    def docdata(self, object, name=None, mod=None, cl=None, *ignored):
-        results = []
-        push = results.append
-
-        if name:
-            push(self.bold(name))
-            push('\n')
-        doc = pydoc.getdoc(object) or ''
-        if doc:
-            push("MARKDOWNSTART")
-            push(doc)
-            push("MARKDOWNSTOP")
-            push('\n')
-        return ''.join(results)
 
-    docproperty = docdata
+@functools.lru_cache(maxsize=512)
+def render_doc(object):
+    """
+    pydoc text of the target object. It doesn't
+    change, thus selecting the same class again
+    reuses it. It doesn't depend on the context either.
+    """
+    return pydoc.render_doc(object, renderer=DocStringRenderer())
 
+def display_text_lines(C, lines_of_text):
+    """
+    Display lines of text that may contain ANSI escape
+    sequences. Consecutive lines without escape sequences
+    are gathered in a single dcg.Text.
+    """
+    plain_lines = []
+    for text in lines_of_text:
+        if "\u001b" not in text:
+            plain_lines.append(text)
+            continue
+        if len(plain_lines) > 0:
+            dcg.Text(C, wrap=0, value="\n".join(plain_lines))
+            plain_lines = []
+        TextAnsi(C, value=text)
+    if len(plain_lines) > 0:
+        dcg.Text(C, wrap=0, value="\n".join(plain_lines))
 
 def display_docstring(C, object):
     """
     Retrieve the docstring of the target
     object and display the text in a box
     """
-    docstring = pydoc.render_doc(object, renderer=DocStringRenderer(C))
-    keyword = dir(dcg) + dir(object)
-    markdown_starts = docstring.split("MARKDOWNSTART")
-    in_markdown = False
-    for markdown in markdown_starts:
-        if not(in_markdown):
-            assert(not("MARKDOWNSTOP" in markdown))
-            lines_of_text = markdown.split("\n")
-            for text in lines_of_text:
-                TextAnsi(C, value=text)
-            in_markdown = True
-        else:
-            markdown_end = markdown.split("MARKDOWNSTOP")
-            assert(len(markdown_end) <= 2)
-            MarkDownText(C, markdown_end[0])
-            in_markdown = False
-            if len(markdown_end) == 2:
-                lines_of_text = markdown_end[1].split("\n")
-                for text in lines_of_text:
-                    TextAnsi(C, value=text)
-            in_markdown = True
-
+    display_text_lines(C, render_doc(object).split("\n"))
 
 
+def get_tooltip_renderer(C):
+    """
+    MarkDownText in which the tooltips are rendered
+    before their content is moved into the tooltip.
+    A single detached renderer is shared by all the
+    TextWithDocstring of a context, which keep it alive.
+    """
+    return get_shared(C, "tooltip_renderer",
+                      lambda: MarkDownText(C, attach=False, wrap=1200))
 
 class TextWithDocstring(dcg.Text):
     def __init__(self, C, target, **kwargs):
         super().__init__(C, **kwargs)
         self.target = target
         self.value = target.__name__
+        self.tooltip_renderer = get_tooltip_renderer(C)
+        docstring = getattr(target, '__doc__', None)
+        if docstring is not None:
+            # Have the docstring parsed before it is hovered
+            _PARSE_POOL.submit(parse_markdown, docstring)
         self.handlers = [
             dcg.GotHoverHandler(C, callback=self.display_tooltip)
         ]
@@ -495,7 +832,10 @@ class TextWithDocstring(dcg.Text):
 
         # prerender else it appears not smooth
         # to have the tooltip render first empty
-        md_text = MarkDownText(self.context, attach=False, wrap=1200, value=docstring)
+        md_text = self.tooltip_renderer
+        # Setting value appends to the children
+        md_text.children = []
+        md_text.value = docstring
 
         with dcg.utils.TemporaryTooltip(self.context, target=self, parent=window) as tt:
             for child in md_text.children:
@@ -504,52 +844,87 @@ class TextWithDocstring(dcg.Text):
         # Indicate we have updated content
         self.context.viewport.wake()
 
+# The classification of the attributes of a class
+# doesn't change, thus it is done only once.
+_INTROSPECT_CACHE = {}
+
+def classify_attributes(C, object_class):
+    """
+    Sort the attributes of an item class into
+    (writable properties, read-only properties,
+     dynamic properties, methods, disabled properties)
+    """
+    cached = _INTROSPECT_CACHE.get(object_class, None)
+    if cached is not None:
+        return cached
+
+    class_attributes = [v[0] for v in inspect.getmembers_static(object_class)]
+    instance = object_class(C, attach=False)
+    attributes = dir(instance)
+    dynamic_attributes = set(attributes).difference(set(class_attributes))
+    disabled_properties = []
+    read_only_properties = []
+    writable_properties = []
+    dynamic_properties = []
+    methods = []
+    for attr in sorted(attributes):
+        if attr[:2] == "__":
+            continue
+        attr_inst = getattr(object_class, attr, None)
+        if attr_inst is not None and inspect.isbuiltin(attr_inst):
+            continue
+        is_dynamic = attr in dynamic_attributes
+        default_value = None
+        is_accessible = False
+        is_writable = False
+        is_property = inspect.isdatadescriptor(attr_inst)
+        is_class_method = inspect.ismethoddescriptor(attr_inst)
+        try:
+            default_value = getattr(instance, attr)
+            is_accessible = True
+            setattr(instance, attr, default_value)
+            is_writable = True
+        except AttributeError:
+            pass
+        except (TypeError, ValueError):
+            is_writable = True
+            pass
+        if is_property:
+            if is_writable:
+                writable_properties.append(attr)
+            elif is_accessible:
+                read_only_properties.append(attr)
+            else:
+                disabled_properties.append(attr)
+        elif is_dynamic and is_accessible:
+            dynamic_properties.append(attr)
+        elif is_class_method:
+            methods.append(attr)
+
+    result = (writable_properties, read_only_properties,
+              dynamic_properties, methods, disabled_properties)
+    _INTROSPECT_CACHE[object_class] = result
+    return result
+
+def classify_all_attributes(C):
+    """
+    Fill the classification cache for all the
+    documented items, such that selecting one
+    doesn't have to wait for it.
+    """
+    start_item_categories_build().join()
+    for item_name in item_categories:
+        try:
+            classify_attributes(C, getattr(dcg, item_name))
+        except Exception: # Shared*
+            pass
+
 class InteractiveDocstring(dcg.ChildWindow):
     def __init__(self, C, object_class, **kwargs):
         super().__init__(C, **kwargs)
 
-        class_attributes = [v[0] for v in inspect.getmembers_static(object_class)]
-        instance = object_class(C, attach=False)
-        attributes = dir(instance)
-        dynamic_attributes = set(attributes).difference(set(class_attributes))
-        disabled_properties = []
-        read_only_properties = []
-        writable_properties = []
-        dynamic_properties = []
-        methods = []
-        for attr in sorted(attributes):
-            if attr[:2] == "__":
-                continue
-            attr_inst = getattr(object_class, attr, None)
-            if attr_inst is not None and inspect.isbuiltin(attr_inst):
-                continue
-            is_dynamic = attr in dynamic_attributes
-            default_value = None
-            is_accessible = False
-            is_writable = False
-            is_property = inspect.isdatadescriptor(attr_inst)
-            is_class_method = inspect.ismethoddescriptor(attr_inst)
-            try:
-                default_value = getattr(instance, attr)
-                is_accessible = True
-                setattr(instance, attr, default_value)
-                is_writable = True
-            except AttributeError:
-                pass
-            except (TypeError, ValueError):
-                is_writable = True
-                pass
-            if is_property:
-                if is_writable:
-                    writable_properties.append(attr)
-                elif is_accessible:
-                    read_only_properties.append(attr)
-                else:
-                    disabled_properties.append(attr)
-            elif is_dynamic and is_accessible:
-                dynamic_properties.append(attr)
-            elif is_class_method:
-                methods.append(attr)
+        (writable_properties, read_only_properties,
+         dynamic_properties, methods, _) = classify_attributes(C, object_class)
 
         with self:
             if len(writable_properties) > 0:
@@ -576,103 +951,208 @@ class InteractiveDocstring(dcg.ChildWindow):
 
         
 
+@functools.lru_cache(maxsize=None)
+def is_item_sub_class(name, targets):
+    """
+    Whether the dcg attribute name is a subclass
+    of one of the classes of the targets tuple.
+    """
+    item = getattr(dcg, name, None)
+    return isinstance(item, type) and issubclass(item, targets)
+
+filter_names = {
+    "All": (dcg.baseItem, dcg.SharedValue),
+    "Ui items": (dcg.uiItem, dcg.Texture),
+    "Fonts": (dcg.baseFont,),
+    "Handlers": (dcg.baseHandler,),
+    "Drawings": (dcg.drawingItem, dcg.Texture),
+    "Plots": (dcg.plotElement, dcg.Plot, dcg.PlotAxisConfig, dcg.PlotLegendConfig),
+    "Themes": (dcg.baseTheme,),
+    "Values": (dcg.SharedValue,)
+}
+
+def get_item_categories(filter_names):
+    """
+    Map the name of each dcg item to the frozenset of
+    the names of the filters it belongs to.
+    Done in a single pass over the dcg items.
+    """
+    item_categories = {}
+    for item_name in dir(dcg):
+        # remove items not starting with an upper case,
+        # which are mainly for internal use, or items finishing by _
+        if not(item_name[0].isupper()) or item_name[-1] == '_':
+            continue
+        categories = frozenset(name for (name, targets) in filter_names.items()
+                               if is_item_sub_class(item_name, targets))
+        if len(categories) > 0:
+            item_categories[item_name] = categories
+    return item_categories
+
+# The dcg items do not change, thus they are sorted
+# into the filters once. This is done in a background
+# thread, started when the documentation is launched
+# (or first displayed), while the viewport initializes.
+item_categories = {}
+_item_categories_build = None
+_item_categories_lock = threading.Lock()
+def _build_item_categories():
+    item_categories.update(get_item_categories(filter_names))
+
+def start_item_categories_build():
+    """
+    Start sorting the items into the filters,
+    if not already started. Returns the thread
+    to join before reading item_categories.
+    """
+    global _item_categories_build
+    with _item_categories_lock:
+        if _item_categories_build is None:
+            _item_categories_build = threading.Thread(target=_build_item_categories, daemon=True)
+            _item_categories_build.start()
+        return _item_categories_build
+
+def get_framed_theme(C):
+    return get_shared(C, "framed_theme",
+                      lambda: dcg.ThemeStyleImGui(C, FramePadding=(4,3), FrameBorderSize=1, ItemSpacing=(8, 4)))
+
 class AvailableItems(dcg.Layout):
     def __init__(self, C, **kwargs):
         super().__init__(C, **kwargs)
+        self._current_selected = None
+        self._last_filter = None
 
         with self:
-            with dcg.HorizontalLayout(C, theme=dcg.ThemeStyleImGui(C, FramePadding=(0,0), FrameBorderSize=0, ItemSpacing=(0, 0))):
+            with dcg.HorizontalLayout(C, theme=get_no_spacing_theme(C)):
                 with dcg.VerticalLayout(C):
                     filter = dcg.Combo(C, width=200)
                     left = dcg.ChildWindow(C, height=-1, width=200)
                 right = dcg.ChildWindow(C, height=-1, width=-1)
 
-            def is_item_sub_class(name, targets):
-                try:
-                    item = getattr(dcg, name)
-                    for target in targets:
-                        if issubclass(item, target):
-                            return True
-                except Exception:
-                    return False
-            filter_names = {
-                "All": [dcg.baseItem, dcg.SharedValue],
-                "Ui items": [dcg.uiItem, dcg.Texture],
-                "Fonts": [dcg.baseFont],
-                "Handlers": [dcg.baseHandler],
-                "Drawings": [dcg.drawingItem, dcg.Texture],
-                "Plots": [dcg.plotElement, dcg.Plot, dcg.PlotAxisConfig, dcg.PlotLegendConfig],
-                "Themes": [dcg.baseTheme],
-                "Values": [dcg.SharedValue]
-            }
             filter.items=filter_names.keys()
             filter.value="All"
 
             def update_item_list(sender, item, value):
-                parent_classes = filter_names[value]
-                dcg_items = dir(dcg)
-                # remove items not starting with an upper case,
-                # which are mainly for internal use, or items finishing by _
-                dcg_items = [i for i in dcg_items if i[0].isupper() and i[-1] != '_']
-                # remove items that are not subclasses of the target.
-                dcg_items = [i for i in dcg_items if is_item_sub_class(i, parent_classes)]
-                # Clear the previous list
-                left.children = []
-                with left:
-                    for item_name in dcg_items:
-                        dcg.Selectable(C, label=item_name, callback=handle_selection)
+                if value == self._last_filter:
+                    return
+                self._last_filter = value
+                for (selectable, categories) in selectables:
+                    selectable.show = value in categories
                 C.viewport.wake()
+            documentations = {}
             def handle_selection(item):
-                # Unselect the other items
-                for other_item in item.parent.children:
-                    if other_item is item:
-                        continue
-                    if not(isinstance(other_item, dcg.Selectable)):
-                        continue
-                    other_item.value = False
-                # Clear previous text
-                right.children = []
-                # Display text
-                with right:
-                    object_class = getattr(dcg, item.label)
+                previous = self._current_selected
+                if previous is item:
+                    # Clicking again unselected the item. Keep
+                    # it selected, its documentation is displayed.
+                    item.value = True
+                    C.viewport.wake()
+                    return
+                # The text of each item is built once, detached,
+                # and attached in a single assignment. It is then
+                # kept to be shown again.
+                object_class = item.user_data
+                content = documentations.get(object_class, None)
+                if content is None:
+                    content = dcg.Layout(C, attach=False)
                     try:
-                        InteractiveDocstring(C, object_class, width=0, auto_resize_y=True,
-                                             theme=dcg.ThemeStyleImGui(C, FramePadding=(4,3), FrameBorderSize=1, ItemSpacing=(8, 4)))
-                    except: # Shared*
-                        pass
-                    display_docstring(C, object_class)
+                        with content:
+                            try:
+                                InteractiveDocstring(C, object_class, width=0, auto_resize_y=True,
+                                                     theme=get_framed_theme(C))
+                            except: # Shared*
+                                pass
+                            display_docstring(C, object_class)
+                    except Exception:
+                        # Keep the previous selection
+                        print(traceback.format_exc())
+                        item.value = False
+                        C.viewport.wake()
+                        return
+                    content.parent = right
+                    documentations[object_class] = content
+                # Unselect the previous item and hide its text
+                if previous is not None:
+                    previous.value = False
+                    documentations[previous.user_data].show = False
+                self._current_selected = item
+                content.show = True
                 C.viewport.wake()
+            # The Selectables are built once. Changing the
+            # filter only changes which ones are shown.
+            # They are attached to left in a single assignment,
+            # and keep the documented class in user_data.
+            start_item_categories_build().join()
+            selectables = [
+                (dcg.Selectable(C, label=item_name, show=False,
+                                user_data=getattr(dcg, item_name),
+                                callback=handle_selection, attach=False),
+                 categories)
+                for (item_name, categories) in item_categories.items()
+            ]
+            left.children = [selectable for (selectable, _) in selectables]
+
             update_item_list(filter, filter, filter.value)
             filter.callbacks = [update_item_list]
 
 
+# The documents are only read again if they were modified
+_DOCUMENT_CACHE = {}
+
+def read_document(docpath):
+    """
+    Content of the document file at docpath.
+    The parsing of the content is cached
+    by parse_markdown.
+    """
+    docpath = os.path.abspath(docpath)
+    mtime = os.stat(docpath).st_mtime
+    cached = _DOCUMENT_CACHE.get(docpath)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(docpath, 'r') as fp:
+        text = fp.read()
+    _DOCUMENT_CACHE[docpath] = (mtime, text)
+    return text
+
+
 class DocumentationWindow(dcg.Window):
     def __init__(self, C, width=1000, height=600, label="Documentation", **kwargs):
         super().__init__(C, width=width, height=height, label=label, **kwargs)
 
         with self:
             radio_button = dcg.RadioButton(C)
-            selection = {
-                "Available items": AvailableItems(C, show=False),
+            # The panels are built only when first selected
+            def make_document(docpath):
+                return MarkDownText(C, parent=self, value=read_document(docpath))
+            factories = {
+                "Available items": lambda: AvailableItems(C, parent=self),
             }
             base_dir = dcg.__path__[0]
             doc_dir = os.path.join(base_dir, 'docs')
-            for doc in os.listdir(doc_dir):
-                if doc[-3:] == '.md':
-                    docpath = os.path.join(doc_dir, doc)
-                    docname = os.path.basename(doc)[:-3]
-                    docname = "".join([str.upper(docname[0]), docname[1:]])
-                    with open(docpath, 'r') as fp:
-                        text = fp.read()
-                    selection[docname] = MarkDownText(C, show=False, value=text)
-
-            radio_button.items = selection.keys()
+            with os.scandir(doc_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith('.md'):
+                        docname = entry.name[:-3]
+                        docname = "".join([str.upper(docname[0]), docname[1:]])
+                        factories[docname] = functools.partial(make_document, entry.path)
+
+            radio_button.items = list(factories.keys())
+            selection = {}
+            self._shown = None
             def pick_selection(sender, target, value):
-                # Unselect previous items:
-                for item in selection.values():
-                    item.show = False
+                # Only refresh when the displayed panel changes
+                if value == self._shown:
+                    return
+                # Hide the previous panel
+                if self._shown is not None:
+                    selection[self._shown].show = False
+                if value not in selection:
+                    selection[value] = factories[value]()
                 # Display selected item
                 selection[value].show = True
+                self._shown = value
+                C.viewport.wake()
             radio_button.value = "Available items"
             radio_button.callbacks = [pick_selection]
             radio_button.horizontal = True
@@ -683,6 +1163,7 @@ class DocumentationWindow(dcg.Window):
 
 def launch_documentation():
     C = dcg.Context()
+    start_item_categories_build()
     # vsync: limit to screen refresh rate and have no tearing
     # wait_for_input: Do not refresh until a change is detected (C.viewport.wake() to help)
     C.viewport.initialize(vsync=True,
@@ -691,6 +1172,8 @@ def launch_documentation():
                           title="DearCyGui documentation")
     # primary: use the whole window area
     DocumentationWindow(C, primary=True, width=0, height=0)
+    # Introspect the items while the user looks at the list
+    threading.Thread(target=classify_all_attributes, args=(C,), daemon=True).start()
 
     while C.running:
         # can_skip_presenting: no GPU re-rendering on input that has no impact (such as mouse motion) 